@@ -1,19 +1,24 @@
+import atexit
+import hashlib
 import io
+import itertools
 import json
 import platform
+import queue
+import shutil
 import tempfile
+import threading
 import time
 import traceback
 import uuid
-import urllib.error
-import urllib.request
+import xml.etree.ElementTree as ET
+import zipfile
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 import sys
 
+import requests
 import streamlit as st
-from openpyxl import load_workbook
-import yaml
 
 # --- Robust module import ---
 # On Streamlit Cloud the working directory / import path can vary depending
@@ -89,15 +94,17 @@ def _summarize_stats(stats: dict | None) -> dict:
         if not isinstance(v, dict):
             month_summary[k] = {"status": str(v)}
             continue
-        st_m = str(v.get("status", "")).upper()
+        status = v.get("status")
         se = v.get("solver_error")
+        se_short = None
         if se:
             greedy_months.append(k)
-        if "INFEAS" in st_m:
+            se_short = str(se)[:400]
+        if "INFEAS" in str(status or "").upper():
             infeasible_months.append(k)
         month_summary[k] = {
-            "status": v.get("status"),
-            "solver_error": (str(se)[:400] if se else None),
+            "status": status,
+            "solver_error": se_short,
             "autorelax": v.get("autorelax"),
         }
 
@@ -109,8 +116,123 @@ def _summarize_stats(stats: dict | None) -> dict:
     }
 
 
+def _event_headline(event: dict) -> str:
+    return (
+        f"{event.get('result', 'unknown').upper()} | "
+        f"{event.get('year')}-{int(event.get('month') or 0):02d} | "
+        f"template={event.get('template_mode')} | "
+        f"sheet={event.get('sheet_name_used')} | "
+        f"operator={event.get('operator') or '-'}"
+    )
+
+
+# Remaining API budget per token, updated from X-RateLimit-Remaining; when it
+# drops below the floor we drop audit events instead of burning the budget
+# needed by the rest of the app.
+_RATE_REMAINING: dict[str, int] = {}
+_RATE_REMAINING_FLOOR = 20
+_RETRYABLE_HTTP = (403, 429, 502, 503, 504)
+_RETRY_DELAYS_S = (1, 2, 4, 8, 16, 32)
+
+
+def _retry_after_s(headers) -> float:
+    try:
+        ra = headers.get("Retry-After")
+        if ra:
+            return float(ra)
+        reset = headers.get("X-RateLimit-Reset")
+        if reset:
+            return max(0.0, float(reset) - time.time())
+    except (TypeError, ValueError):
+        pass
+    return 0.0
+
+
+def _post_audit_comment(cfg: dict, events: list[dict], session: requests.Session) -> None:
+    """Send one Issue comment for a batch of audit events (blocking POST).
+
+    Transient GitHub failures (rate limit, 5xx) are retried with exponential
+    backoff, honoring Retry-After / X-RateLimit-Reset when provided.
+    """
+    token = cfg["token"]
+    if _RATE_REMAINING.get(token, _RATE_REMAINING_FLOOR + 1) <= _RATE_REMAINING_FLOOR:
+        return  # budget nearly exhausted: drop rather than hit the limit
+    url = f"https://api.github.com/repos/{cfg['repo']}/issues/{cfg['issue']}/comments"
+    headlines = "\n".join(_event_headline(ev) for ev in events)
+    payload = events[0] if len(events) == 1 else events
+    text = headlines + "\n\n```json\n" + json.dumps(payload, ensure_ascii=False) + "\n```"
+    # Build the single-key wrapper by hand: dumping {"body": text} would walk
+    # and re-escape the whole (potentially 8 KB+) comment a second time.
+    data = b'{"body":' + json.dumps(text, ensure_ascii=False).encode("utf-8") + b"}"
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json",
+    }
+    for attempt, delay in enumerate(_RETRY_DELAYS_S):
+        resp = session.post(url, data=data, headers=headers, timeout=10)
+        remaining = resp.headers.get("X-RateLimit-Remaining")
+        if remaining is not None:
+            try:
+                _RATE_REMAINING[token] = int(remaining)
+            except ValueError:
+                pass
+        if resp.ok:
+            return
+        if resp.status_code not in _RETRYABLE_HTTP or attempt == len(_RETRY_DELAYS_S) - 1:
+            resp.raise_for_status()
+            return
+        time.sleep(max(delay, _retry_after_s(resp.headers)))
+
+
+_AUDIT_BATCH_MAX = 20
+
+
+def _audit_worker(q: "queue.Queue[tuple[dict, dict]]") -> None:
+    # One keep-alive session for the worker's lifetime: reusing the TLS
+    # connection removes the handshake cost that dominates these small POSTs.
+    session = requests.Session()
+    session.headers.update({
+        "Accept": "application/vnd.github+json",
+        "User-Agent": "turni-autogen-streamlit",
+    })
+    while True:
+        cfg, event = q.get()
+        events = [event]
+        # Coalesce any backlog into the same comment: send immediately when
+        # idle, batch when several runs queued up behind a slow POST.
+        while len(events) < _AUDIT_BATCH_MAX:
+            try:
+                cfg, ev = q.get_nowait()
+            except queue.Empty:
+                break
+            events.append(ev)
+        try:
+            _post_audit_comment(cfg, events, session)
+        except Exception:
+            pass  # best-effort: audit log must never break the app
+        finally:
+            for _ in events:
+                q.task_done()
+
+
+def _flush_audit_queue(q: "queue.Queue", timeout_s: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while not q.empty() and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+
+@st.cache_resource(show_spinner=False)
+def _audit_queue() -> "queue.Queue[tuple[dict, dict]]":
+    # One queue + daemon worker per process (the script body reruns on every
+    # interaction, so the singleton must live behind cache_resource).
+    q: "queue.Queue[tuple[dict, dict]]" = queue.Queue()
+    threading.Thread(target=_audit_worker, args=(q,), name="github-audit-log", daemon=True).start()
+    atexit.register(_flush_audit_queue, q)
+    return q
+
+
 def _github_audit_log(event: dict) -> tuple[bool, str]:
-    """Append an audit event as a comment to a GitHub Issue.
+    """Queue an audit event for the background GitHub Issue comment worker.
 
     Configure in Streamlit Secrets (Manage app → Settings → Secrets):
 
@@ -119,7 +241,9 @@ def _github_audit_log(event: dict) -> tuple[bool, str]:
     repo  = "owner/repo"
     issue = 1
 
-    Token needs permission to write Issue comments.
+    Token needs permission to write Issue comments. The POST happens on a
+    daemon thread so the UI never blocks on the GitHub round-trip; queued
+    events are coalesced into a single comment when a backlog builds up.
     """
     try:
         gh = st.secrets.get("github", {})
@@ -128,64 +252,77 @@ def _github_audit_log(event: dict) -> tuple[bool, str]:
         issue = gh.get("issue")
         if not (token and repo and issue):
             return False, "github audit log not configured"
+        cfg = {"token": token, "repo": str(repo), "issue": int(issue)}
+        _audit_queue().put((cfg, event))
+        return True, "queued"
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}"
 
-        url = f"https://api.github.com/repos/{repo}/issues/{int(issue)}/comments"
 
-        # Human-friendly first line + JSON payload
-        headline = (
-            f"{event.get('result', 'unknown').upper()} | "
-            f"{event.get('year')}-{int(event.get('month') or 0):02d} | "
-            f"template={event.get('template_mode')} | "
-            f"sheet={event.get('sheet_name_used')} | "
-            f"operator={event.get('operator') or '-'}"
-        )
-        body = {
-            "body": headline
-            + "\n\n```json\n"
-            + json.dumps(event, ensure_ascii=False)
-            + "\n```"
-        }
+_REPO_RULES_PATH = _APP_DIR / "Regole_Turni.yml"
+
+
+@st.cache_resource(show_spinner=False)
+def _repo_rules_bytes(mtime: float) -> bytes:
+    # The repo rules file is static within a deployment; keying on mtime keeps
+    # a single in-memory copy per process instead of re-reading it per run.
+    return _REPO_RULES_PATH.read_bytes()
+
+
+def _spill(uploaded, dst: Path, chunk: int = 1 << 20) -> None:
+    """Stream an UploadedFile to disk without materializing it as bytes.
+
+    `getvalue()` copies the whole upload into RAM before writing; copying
+    chunk-wise bounds peak memory to one chunk. Seek first: the buffer may
+    have been read already in this rerun.
+    """
+    uploaded.seek(0)
+    with open(dst, "wb") as f:
+        shutil.copyfileobj(uploaded, f, chunk)
 
-        data = json.dumps(body).encode("utf-8")
-        req = urllib.request.Request(
-            url,
-            data=data,
-            method="POST",
-            headers={
-                "Authorization": f"Bearer {token}",
-                "Accept": "application/vnd.github+json",
-                "User-Agent": "turni-autogen-streamlit",
-                "Content-Type": "application/json",
-            },
-        )
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            return True, f"ok ({resp.status})"
-    except urllib.error.HTTPError as e:
-        try:
-            detail = e.read().decode("utf-8", errors="ignore")[:500]
-        except Exception:
-            detail = ""
-        return False, f"HTTPError {getattr(e, 'code', '')} {detail}"
-    except Exception as e:
-        return False, f"{type(e).__name__}: {e}"
+
+_SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}sheet"
+
+
+def _sheet_names(data: bytes) -> list[str]:
+    """Read the sheet names of an XLSX without a full openpyxl parse.
+
+    openpyxl's load_workbook (even read_only) still parses styles, shared
+    strings and relationships; for probing the sheet list we only need
+    xl/workbook.xml out of the ZIP container.
+    """
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        root = ET.fromstring(z.read("xl/workbook.xml"))
+    return [s.get("name") for s in root.iter(_SHEET_NS)]
+
+
+@st.cache_data(show_spinner=False)
+def _sheet_names_cached(data: bytes) -> list[str]:
+    # Keyed on the file bytes: the probe runs once per uploaded file instead
+    # of on every widget interaction.
+    return _sheet_names(data)
+
+
+_MONTHS_IT = (
+    "",  # 1-based index
+    "Gennaio",
+    "Febbraio",
+    "Marzo",
+    "Aprile",
+    "Maggio",
+    "Giugno",
+    "Luglio",
+    "Agosto",
+    "Settembre",
+    "Ottobre",
+    "Novembre",
+    "Dicembre",
+)
 
 
 def _month_label_it(month: int) -> str:
-    names = {
-        1: "Gennaio",
-        2: "Febbraio",
-        3: "Marzo",
-        4: "Aprile",
-        5: "Maggio",
-        6: "Giugno",
-        7: "Luglio",
-        8: "Agosto",
-        9: "Settembre",
-        10: "Ottobre",
-        11: "Novembre",
-        12: "Dicembre",
-    }
-    return names.get(int(month), str(month))
+    m = int(month)
+    return _MONTHS_IT[m] if 1 <= m <= 12 else str(m)
 
 
 st.set_page_config(page_title="Turni Autogenerator", layout="wide")
@@ -234,47 +371,81 @@ unav_up = st.file_uploader(
     accept_multiple_files=False,
 )
 
-prev_out_up = st.file_uploader(
-    "Output mese precedente (opzionale: .xlsx, per vincoli inter-mese su NOTTI)",
-    type=["xlsx"],
-    accept_multiple_files=False,
-)
+# Fragment: interacting with the upload/sheet picker reruns only this subtree,
+# not the whole script (and unrelated widgets no longer re-probe the XLSX).
+@st.fragment
+def _prev_picker() -> None:
+    prev_up = st.file_uploader(
+        "Output mese precedente (opzionale: .xlsx, per vincoli inter-mese su NOTTI)",
+        type=["xlsx"],
+        accept_multiple_files=False,
+        key="prev_out_up",
+    )
+    sel: str | None = None
+    if prev_up is not None:
+        try:
+            sheets_prev = _sheet_names_cached(prev_up.getvalue())
+        except Exception:
+            sheets_prev = []
+        if sheets_prev:
+            st.caption("Fogli trovati nel file precedente: " + ", ".join(sheets_prev))
+            optp = st.selectbox(
+                "Seleziona foglio (file precedente)",
+                options=["(foglio attivo / primo foglio)"] + sheets_prev,
+                index=0,
+            )
+            sel = None if optp.startswith("(") else optp
+        else:
+            st.warning("Non riesco a leggere i fogli del file precedente: userò il primo foglio.")
+    st.session_state["prev_sheet_name_from_upload"] = sel
 
-prev_sheet_name_from_upload: str | None = None
-if prev_out_up is not None:
-    try:
-        wb_prev = load_workbook(io.BytesIO(prev_out_up.getvalue()), read_only=True, data_only=True)
-        sheets_prev = wb_prev.sheetnames
-    except Exception:
-        sheets_prev = []
-    if sheets_prev:
-        st.caption("Fogli trovati nel file precedente: " + ", ".join(sheets_prev))
-        optp = st.selectbox(
-            "Seleziona foglio (file precedente)",
-            options=["(foglio attivo / primo foglio)"] + sheets_prev,
-            index=0,
-        )
-        prev_sheet_name_from_upload = None if optp.startswith("(") else optp
-    else:
-        st.warning("Non riesco a leggere i fogli del file precedente: userò il primo foglio.")
-        prev_sheet_name_from_upload = None
+
+_prev_picker()
+prev_out_up = st.session_state.get("prev_out_up")
+prev_sheet_name_from_upload: str | None = st.session_state.get("prev_sheet_name_from_upload")
 
 
 # --- Carryover manuale (quando non hai l'output precedente) ---
 # Best-effort list of doctors from rules (to reduce typos)
+@st.cache_data(show_spinner=False)
+def _parse_rules_bytes(raw: bytes) -> dict:
+    # Cached on the raw bytes: reruns with an unchanged YAML skip the parse.
+    # yaml is imported lazily: with a warm cache the module is never needed.
+    import yaml
+
+    return yaml.safe_load(raw)
+
+
+@st.cache_data(show_spinner=False)
+def _collect_doctors_cached(raw: bytes) -> list[str]:
+    cfg = _parse_rules_bytes(raw)
+    if not isinstance(cfg, dict):
+        return []
+    return [d for d in collect_doctors(cfg) if d and d != "Recupero"]
+
+
+# Session-scoped memo on top of the process-wide cache: flipping between
+# "repo" and "upload" rules (or rerunning with the same source) must not
+# redo hashing/lookups for an unchanged doctor list.
 _doctors_ui = []
 try:
     if use_repo_rules:
-        _rp = Path(__file__).with_name("Regole_Turni.yml")
-        if _rp.exists():
-            _cfg_ui = yaml.safe_load(_rp.read_text(encoding="utf-8"))
-            if isinstance(_cfg_ui, dict):
-                _doctors_ui = [d for d in collect_doctors(_cfg_ui) if d and d != "Recupero"]
+        _sig = ("repo", _REPO_RULES_PATH.stat().st_mtime if _REPO_RULES_PATH.exists() else None)
     else:
-        if rules_up is not None:
-            _cfg_ui = yaml.safe_load(rules_up.getvalue())
-            if isinstance(_cfg_ui, dict):
-                _doctors_ui = [d for d in collect_doctors(_cfg_ui) if d and d != "Recupero"]
+        _sig = (
+            "upload",
+            hashlib.blake2b(rules_up.getvalue(), digest_size=8).digest() if rules_up is not None else None,
+        )
+    if st.session_state.get("_doctors_sig") == _sig:
+        _doctors_ui = st.session_state.get("_doctors_ui", [])
+    else:
+        if use_repo_rules:
+            if _REPO_RULES_PATH.exists():
+                _doctors_ui = _collect_doctors_cached(_repo_rules_bytes(_sig[1]))
+        elif rules_up is not None:
+            _doctors_ui = _collect_doctors_cached(rules_up.getvalue())
+        st.session_state["_doctors_sig"] = _sig
+        st.session_state["_doctors_ui"] = _doctors_ui
 except Exception:
     _doctors_ui = []
 
@@ -300,17 +471,16 @@ with st.expander("Avanzate: template Excel", expanded=False):
         help="Se disattivato, il template viene creato automaticamente da mese/anno + regole.",
     )
 
-    template_up = None
-    sheet_name_from_upload: str | None = None
-
-    if use_custom_template:
-        template_up = st.file_uploader("Template turni (.xlsx)", type=["xlsx"], accept_multiple_files=False)
-
-        if template_up is not None:
+    @st.fragment
+    def _template_picker() -> None:
+        tmp_up = st.file_uploader(
+            "Template turni (.xlsx)", type=["xlsx"], accept_multiple_files=False, key="template_up"
+        )
+        sel: str | None = None
+        if tmp_up is not None:
             # Fogli reali dal template → dropdown (niente input libero)
             try:
-                wb_tmp = load_workbook(io.BytesIO(template_up.getvalue()), read_only=True, data_only=True)
-                sheets = wb_tmp.sheetnames
+                sheets = _sheet_names_cached(tmp_up.getvalue())
             except Exception:
                 sheets = []
 
@@ -321,13 +491,20 @@ with st.expander("Avanzate: template Excel", expanded=False):
                     options=["(foglio attivo / primo foglio)"] + sheets,
                     index=0,
                 )
-                sheet_name_from_upload = None if opt.startswith("(") else opt
+                sel = None if opt.startswith("(") else opt
             else:
                 st.warning("Non riesco a leggere i fogli: verrà usato il foglio attivo (primo foglio).")
-                sheet_name_from_upload = None
         else:
             st.info("Carica un template .xlsx per abilitarne la selezione foglio.")
+        st.session_state["sheet_name_from_upload"] = sel
 
+    template_up = None
+    sheet_name_from_upload: str | None = None
+
+    if use_custom_template:
+        _template_picker()
+        template_up = st.session_state.get("template_up")
+        sheet_name_from_upload = st.session_state.get("sheet_name_from_upload")
     else:
         st.caption(
             "Template auto: verrà creato un Excel con le date del mese e le intestazioni colonne dalla YAML. "
@@ -352,26 +529,25 @@ if run_btn:
 
         # Save rules
         if use_repo_rules:
-            repo_rules = Path(__file__).with_name("Regole_Turni.yml")
-            if not repo_rules.exists():
+            if not _REPO_RULES_PATH.exists():
                 st.error("Non trovo 'Regole_Turni.yml' nel repo. Carica un file regole manualmente.")
                 st.stop()
             rules_path = td / "Regole_Turni.yml"
-            rules_path.write_bytes(repo_rules.read_bytes())
+            rules_path.write_bytes(_repo_rules_bytes(_REPO_RULES_PATH.stat().st_mtime))
             rules_source = "repo"
         else:
             rules_path = td / "Regole_Turni.yml"
-            rules_path.write_bytes(rules_up.getvalue())
+            _spill(rules_up, rules_path)
             rules_source = getattr(rules_up, "name", "upload")
 
         # Prepare template
         if use_custom_template:
             template_path = td / "template.xlsx"
-            template_path.write_bytes(template_up.getvalue())
+            _spill(template_up, template_path)
             template_mode = "upload"
             sheet_name_used = sheet_name_from_upload
             template_filename = getattr(template_up, "name", None)
-            template_bytes = len(template_up.getvalue()) if template_up is not None else None
+            template_bytes = template_path.stat().st_size
         else:
             month_name = _month_label_it(int(month)).upper()
             sheet_auto = f"GUARDIE_{month_name}_{int(year)}"
@@ -388,18 +564,19 @@ if run_btn:
             template_filename = template_path.name
             template_bytes = template_path.stat().st_size if template_path.exists() else None
 
-        # Save unavailability (optional)
-        unav_path = None
+        # Unavailability (optional): the generator accepts file-like objects,
+        # so the upload is passed through without a disk round-trip.
+        unav_arg = None
         if unav_up is not None:
-            unav_path = td / f"unavailability.{unav_up.name.split('.')[-1]}"
-            unav_path.write_bytes(unav_up.getvalue())
+            unav_up.seek(0)
+            unav_arg = unav_up
 
         out_path = td / f"turni_{int(year)}_{int(month):02d}.xlsx"
 
         carryover_by_month = None
         if prev_out_up is not None:
             prev_path = td / f"prev_output_{prev_out_up.name}"
-            prev_path.write_bytes(prev_out_up.getvalue())
+            _spill(prev_out_up, prev_path)
             carry = extract_carryover_from_output_xlsx(prev_path, rules_path, sheet_name=prev_sheet_name_from_upload)
             # Safety: apply the automatic "block day 1" only when the previous file really ends
             # the day before the month we are generating.
@@ -421,14 +598,13 @@ if run_btn:
             st.info(carry.get('note') or "Carryover letto dal mese precedente.")
 
         # Manual override/integrazione: blocco giorno 1 per NOTTE ultimo giorno mese precedente
-        manual_names = []
-        # from multiselect
-        manual_names.extend([x.strip() for x in (manual_block_first_selected or []) if str(x).strip()])
-        # from free-text fallback
-        manual_names.extend([x.strip() for x in (manual_block_first_text or '').split(',') if x.strip()])
-        # de-duplicate, preserve order
-        seen = set()
-        manual_names = [n for n in manual_names if not (n in seen or seen.add(n))]
+        # (multiselect + free-text, stripped, de-duplicated preserving order)
+        manual_names = list(dict.fromkeys(
+            s for s in itertools.chain(
+                (str(x).strip() for x in (manual_block_first_selected or [])),
+                (x.strip() for x in (manual_block_first_text or '').split(',')),
+            ) if s
+        ))
         if manual_names:
             if carryover_by_month is None:
                 carryover_by_month = {(int(year), int(month)): {'recent_nights': [], 'block_all_on_first_day': manual_names, 'note': 'Carryover manuale (solo blocco giorno 1)'}}
@@ -436,9 +612,8 @@ if run_btn:
                 key = (int(year), int(month))
                 carry = carryover_by_month.get(key) or {}
                 cur = list(carry.get('block_all_on_first_day') or [])
-                for n in manual_names:
-                    if n not in cur:
-                        cur.append(n)
+                cur_set = set(cur)
+                cur.extend(n for n in manual_names if not (n in cur_set or cur_set.add(n)))
                 carry['block_all_on_first_day'] = cur
                 carryover_by_month[key] = carry
             st.info('Carryover manuale: blocco su giorno 1 per: ' + ', '.join(manual_names))
@@ -459,7 +634,7 @@ if run_btn:
             "sheet_name_used": sheet_name_used,
             "rules_source": rules_source,
             "unavailability_filename": getattr(unav_up, "name", None) if unav_up is not None else None,
-            "unavailability_bytes": len(unav_up.getvalue()) if unav_up is not None else None,
+            "unavailability_bytes": getattr(unav_up, "size", None) if unav_up is not None else None,
             "python": platform.python_version(),
         }
 
@@ -470,7 +645,7 @@ if run_btn:
                     template_xlsx=template_path,
                     rules_yml=rules_path,
                     out_xlsx=out_path,
-                    unavailability_path=unav_path,
+                    unavailability_path=unav_arg,
                     sheet_name=sheet_name_used,
                     carryover_by_month=carryover_by_month,
                 )
@@ -493,7 +668,12 @@ if run_btn:
                 "duration_s": duration,
                 "error_type": type(e).__name__,
                 "error": str(e),
-                "traceback": traceback.format_exc()[:8000],
+                # limit= bounds the frame count at the source: deep stacks no
+                # longer touch every frame's source file to build text we
+                # would truncate anyway
+                "traceback": "".join(
+                    traceback.format_exception(type(e), e, e.__traceback__, limit=20)
+                )[:8000],
             }
             _github_audit_log(event)
             st.error("Errore durante la generazione dei turni.")
@@ -517,19 +697,24 @@ if run_btn:
                 + ". In quei mesi è stato usato il greedy."
             )
 
-        # Download output
+        # Download output (read once; the buffer also serves any later reuse
+        # in the same rerun without another disk pass)
+        with open(out_path, "rb") as f:
+            out_bytes = f.read()
         st.download_button(
             label="Scarica Excel generato",
-            data=out_path.read_bytes(),
+            data=out_bytes,
             file_name=out_path.name,
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         )
 
         # Offer generated template download when in auto mode
         if template_mode == "auto" and template_path.exists():
+            with open(template_path, "rb") as f:
+                template_out_bytes = f.read()
             st.download_button(
                 label="Scarica template auto (debug)",
-                data=template_path.read_bytes(),
+                data=template_out_bytes,
                 file_name=template_path.name,
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             )
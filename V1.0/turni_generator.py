@@ -21,7 +21,7 @@ import sys
 from collections import defaultdict, Counter
 from copy import deepcopy, copy as _copy
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple, Iterable
+from typing import Dict, IO, List, Optional, Set, Tuple, Iterable
 import pandas as pd
 import yaml
 import openpyxl
@@ -451,20 +451,34 @@ def load_template_days(xlsx_path: Path, sheet_name: Optional[str]=None) -> Tuple
     if not days:
         raise ValueError("No date rows found in column A (starting from row 2).")
     return wb, ws, days
-def load_unavailability(unav_path: Optional[Path]) -> Dict[str, Dict[dt.date, Set[str]]]:
+def load_unavailability(unav_path: "Optional[Path | IO[bytes]]") -> Dict[str, Dict[dt.date, Set[str]]]:
     """
     Returns: unav[doctor][date] = {'Mattina','Pomeriggio','Notte'} (oppure 'Any' per full-day)
+
+    `unav_path` can be a filesystem path or a binary file-like object with a
+    `.name` attribute (e.g. a Streamlit upload): pandas reads both, so callers
+    holding the bytes in memory do not need a tmp-file round trip.
     """
     unav: Dict[str, Dict[dt.date, Set[str]]] = defaultdict(lambda: defaultdict(set))
     if unav_path is None:
         return unav
-    if not unav_path.exists():
-        raise FileNotFoundError(unav_path)
-    if unav_path.suffix.lower() in [".xlsx", ".xls"]:
-        df = pd.read_excel(unav_path)
-    elif unav_path.suffix.lower() in [".csv", ".tsv"]:
-        sep = "\t" if unav_path.suffix.lower() == ".tsv" else ","
-        df = pd.read_csv(unav_path, sep=sep)
+    if hasattr(unav_path, "read"):
+        suffix = Path(str(getattr(unav_path, "name", "") or "")).suffix.lower()
+        try:
+            unav_path.seek(0)
+        except Exception:
+            pass
+        src = unav_path
+    else:
+        if not unav_path.exists():
+            raise FileNotFoundError(unav_path)
+        suffix = unav_path.suffix.lower()
+        src = unav_path
+    if suffix in [".xlsx", ".xls"]:
+        df = pd.read_excel(src)
+    elif suffix in [".csv", ".tsv"]:
+        sep = "\t" if suffix == ".tsv" else ","
+        df = pd.read_csv(src, sep=sep)
     else:
         raise ValueError("Unavailability file must be .xlsx/.xls/.csv/.tsv")
     # Flexible column names
@@ -2144,7 +2158,7 @@ def generate_schedule(
     template_xlsx: "Path | str",
     rules_yml: "Path | str",
     out_xlsx: "Path | str",
-    unavailability_path: "Path | str | None" = None,
+    unavailability_path: "Path | str | IO[bytes] | None" = None,
     sheet_name: "str | None" = None,
     carryover_by_month: Optional[dict] = None,
     **kwargs,
@@ -2158,7 +2172,8 @@ def generate_schedule(
     template_xlsx: path to the Excel template (.xlsx)
     rules_yml: path to the YAML rules file (.yml/.yaml)
     out_xlsx: output Excel path (.xlsx)
-    unavailability_path: optional path to unavailability file (.xlsx/.csv/.tsv)
+    unavailability_path: optional unavailability file (.xlsx/.csv/.tsv), as a
+        path or a binary file-like object
     sheet_name: optional worksheet name in the template
 
     Returns
@@ -2170,7 +2185,10 @@ def generate_schedule(
     template = Path(template_xlsx)
     rules = Path(rules_yml)
     outp = Path(out_xlsx)
-    unav = Path(unavailability_path) if unavailability_path else None
+    if unavailability_path is None or hasattr(unavailability_path, "read"):
+        unav = unavailability_path
+    else:
+        unav = Path(unavailability_path)
 
     cfg = load_rules(rules)
     wb, ws, days = load_template_days(template, sheet_name=sheet_name)
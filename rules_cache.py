@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""Process-wide caches for parsed rules YAML.
+
+`st.cache_data` is global to the Streamlit process, so concurrent sessions
+share a single parse per distinct rules file: the cache key is the raw file
+bytes and invalidates automatically when the YAML changes.
+"""
+
+from __future__ import annotations
+
+import streamlit as st
+import yaml
+
+import turni_generator as tg
+
+
+@st.cache_data(show_spinner=False)
+def parse_rules(raw: bytes) -> dict:
+    cfg = yaml.safe_load(raw)
+    if not isinstance(cfg, dict):
+        raise ValueError("Rules YAML must be a mapping.")
+    return cfg
+
+
+@st.cache_data(show_spinner=False)
+def doctors(raw: bytes) -> list[str]:
+    """Doctor list derived from the rules, computed once per rules version."""
+    cfg = parse_rules(raw)
+    try:
+        return tg.collect_doctors(cfg)
+    except Exception:
+        return sorted(set(cfg.get("doctors") or []))
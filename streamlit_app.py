@@ -1,11 +1,12 @@
 import io
-import tempfile
-import time
-import traceback
+import re
 import csv
 import json
+import shutil
+import hashlib
 import requests
 from datetime import date, datetime
+from functools import lru_cache
 from pathlib import Path
 from collections.abc import Mapping
 
@@ -15,6 +16,7 @@ import yaml
 
 # Local modules
 import github_utils
+import rules_cache
 import unavailability_store as ustore
 import xlsx_utils
 
@@ -27,6 +29,65 @@ APP_BUILD = "2026-01-25-ui-v6"
 # ---- Indisponibilità: fasce ammesse e normalizzazione (per compatibilità con valori "storici") ----
 FASCIA_OPTIONS = ["Mattina", "Pomeriggio", "Notte", "Diurno", "Tutto il giorno"]
 
+# Constants for the month/year pickers: the script reruns top-to-bottom on
+# every interaction, so these are allocated once at import instead of per rerun.
+MONTH_NAMES = {
+    1: "Gennaio", 2: "Febbraio", 3: "Marzo", 4: "Aprile", 5: "Maggio", 6: "Giugno",
+    7: "Luglio", 8: "Agosto", 9: "Settembre", 10: "Ottobre", 11: "Novembre", 12: "Dicembre",
+}
+YEAR_OPTIONS_BASE = list(range(2025, 2046))
+# Prebuilt labels for the month selectbox: format_func runs once per option
+# per redraw, so the strings are formatted a single time at import.
+MONTH_LABELS = {m: f"{m:02d} - {n}" for m, n in MONTH_NAMES.items()}
+
+# direct matches (case-insensitive), including the exact-token aliases that
+# used to live in the fuzzy branches ('d', 'n', 'am', 'pm', ...)
+_FASCIA_DIRECT = {
+    "mattina": "Mattina",
+    "pomeriggio": "Pomeriggio",
+    "notte": "Notte",
+    "diurno": "Diurno",
+    "tutto il giorno": "Tutto il giorno",
+    "tutto giorno": "Tutto il giorno",
+    "all day": "Tutto il giorno",
+    "giornata intera": "Tutto il giorno",
+    "d": "Diurno",
+    "am": "Mattina",
+    "a.m.": "Mattina",
+    "pm": "Pomeriggio",
+    "p.m.": "Pomeriggio",
+    "n": "Notte",
+}
+
+# fuzzy substring matches: one compiled regex per fascia, checked in
+# priority order (each check is a single C-level scan). The order matters:
+# "Tutto il giorno" keywords must win over the per-fascia ones so legacy
+# values like "notte intera" stay a full-day block, not a single fascia.
+_FASCIA_FUZZY = (
+    (re.compile(r"tutto|all|intera"), "Tutto il giorno"),
+    (re.compile(r"diurn|daytime"), "Diurno"),
+    (re.compile(r"matt|morning"), "Mattina"),
+    (re.compile(r"pome|pom|afternoon"), "Pomeriggio"),
+    (re.compile(r"nott|night"), "Notte"),
+)
+
+# Called once per editor row on both the load and save paths; the vocabulary
+# of raw shift strings is tiny, so the cache hit rate is ~100%.
+@lru_cache(maxsize=256)
+def _normalize_fascia_str(s: str) -> tuple[str, bool, bool]:
+    key = " ".join(s.casefold().split())  # collapse whitespace
+
+    canon = _FASCIA_DIRECT.get(key)
+    if canon is not None:
+        return canon, canon != s, False
+
+    for rx, canon in _FASCIA_FUZZY:
+        if rx.search(key):
+            return canon, True, False
+
+    # unknown
+    return "Tutto il giorno", True, True
+
 def normalize_fascia(val: object) -> tuple[str, bool, bool]:
     """Return (canonical_value, changed, unknown).
 
@@ -38,38 +99,7 @@ def normalize_fascia(val: object) -> tuple[str, bool, bool]:
     s = str(val).strip()
     if not s:
         return "", False, False
-    key = s.casefold().strip()
-    key = " ".join(key.split())  # collapse whitespace
-
-    # direct matches (case-insensitive)
-    direct = {
-        "mattina": "Mattina",
-        "pomeriggio": "Pomeriggio",
-        "notte": "Notte",
-        "diurno": "Diurno",
-        "tutto il giorno": "Tutto il giorno",
-        "tutto giorno": "Tutto il giorno",
-        "all day": "Tutto il giorno",
-        "giornata intera": "Tutto il giorno",
-    }
-    if key in direct:
-        canon = direct[key]
-        return canon, canon != s, False
-
-    # fuzzy matches
-    if "tutto" in key or "all" in key or "intera" in key:
-        return "Tutto il giorno", True, False
-    if "diurn" in key or "daytime" in key or key == "d":
-        return "Diurno", True, False
-    if "matt" in key or "morning" in key or key in {"am", "a.m."}:
-        return "Mattina", True, False
-    if "pome" in key or "pom" in key or "afternoon" in key or key in {"pm", "p.m."}:
-        return "Pomeriggio", True, False
-    if "nott" in key or "night" in key or key == "n":
-        return "Notte", True, False
-
-    # unknown
-    return "Tutto il giorno", True, True
+    return _normalize_fascia_str(s)
 # ---------------- Page config & style ----------------
 st.set_page_config(
     page_title="Turni UTIC – Autogeneratore",
@@ -121,10 +151,14 @@ def _get_secret(path, default=None):
             return default
     return cur
 
+# Secrets are immutable for the lifetime of the process, so these lookups are
+# memoized with lru_cache (cheaper than st.cache_data: no input hashing).
+@lru_cache(maxsize=1)
 def _get_admin_pin() -> str:
     # primary: [auth] admin_pin ; fallback: ADMIN_PIN
     return str(_get_secret(("auth", "admin_pin"), _get_secret(("ADMIN_PIN",), "")) or "")
 
+@lru_cache(maxsize=1)
 def _get_doctor_pins() -> dict[str, str]:
     pins = _get_secret(("doctor_pins",), None)
     if isinstance(pins, Mapping):
@@ -139,6 +173,7 @@ def _get_doctor_pins() -> dict[str, str]:
             pass
     return {}
 
+@lru_cache(maxsize=1)
 def _github_cfg() -> dict:
     cfg = _get_secret(("github_unavailability",), None)
     if isinstance(cfg, Mapping):
@@ -156,12 +191,45 @@ def _github_cfg() -> dict:
 
 # ---------------- Rules / doctors ----------------
 def load_rules_from_source(uploaded) -> tuple[dict, Path]:
-    """Return (cfg, rules_path)."""
+    """Return (cfg, rules_path).
+
+    Default rules come from the mtime-keyed cache (no per-rerun disk read
+    or byte hashing); uploaded rules are parsed via rules_cache, keyed on
+    the upload bytes.
+    """
     if uploaded is None:
-        return tg.load_rules(DEFAULT_RULES_PATH), DEFAULT_RULES_PATH
+        return _default_rules(DEFAULT_RULES_PATH.stat().st_mtime), DEFAULT_RULES_PATH
+    import tempfile
+    import time
+
     tmp = Path(tempfile.gettempdir()) / f"rules_{int(time.time())}.yml"
     tmp.write_bytes(uploaded.getvalue())
-    return tg.load_rules(tmp), tmp
+    return rules_cache.parse_rules(uploaded.getvalue()), tmp
+
+def _session_outdir() -> Path:
+    """Long-lived per-session directory for generated outputs.
+
+    Generation runs inside a TemporaryDirectory that is gone by the time a
+    download click reruns the script, so finished files are moved here and
+    served from disk instead of being kept as bytes in session_state.
+    """
+    d = st.session_state.get("_outdir")
+    if not d:
+        import tempfile
+
+        d = tempfile.mkdtemp(prefix="turni_out_")
+        st.session_state["_outdir"] = d
+    return Path(d)
+
+def _spill_upload(uploaded, dst: Path) -> None:
+    """Copy an UploadedFile to dst in 1 MiB chunks.
+
+    Avoids getvalue(), which duplicates the whole upload in RAM before the
+    write; peak memory stays bounded regardless of the file size.
+    """
+    uploaded.seek(0)
+    with open(dst, "wb") as f:
+        shutil.copyfileobj(uploaded, f, 1 << 20)
 
 def doctors_from_cfg(cfg: dict) -> list[str]:
     try:
@@ -169,6 +237,20 @@ def doctors_from_cfg(cfg: dict) -> list[str]:
     except Exception:
         return sorted(set((cfg.get("doctors") or [])))
 
+@st.cache_resource(show_spinner=False)
+def _default_rules(mtime: float) -> dict:
+    """Default rules config, shared across sessions.
+
+    Keyed on the file mtime so an updated Regole_Turni.yml is picked up;
+    cache_resource avoids cache_data's deep-copy of the (large) rules dict,
+    so callers must treat the result as read-only.
+    """
+    return tg.load_rules(DEFAULT_RULES_PATH)
+
+@st.cache_resource(show_spinner=False)
+def _default_doctors(mtime: float) -> list[str]:
+    return doctors_from_cfg(_default_rules(mtime))
+
 # ---------------- GitHub datastore ops ----------------
 def load_store_from_github() -> tuple[list[dict], str | None]:
     g = _github_cfg()
@@ -185,19 +267,82 @@ def load_store_from_github() -> tuple[list[dict], str | None]:
         return [], None
     return ustore.load_store(gf.text), gf.sha
 
-def save_store_to_github(rows: list[dict], sha: str | None, message: str):
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_store() -> tuple[list[dict], str | None]:
+    """Short-TTL cache over the GitHub store.
+
+    Every keystroke in a data editor reruns the script; without this each
+    rerun would issue another GitHub GET. Cleared explicitly after a save.
+    """
+    return load_store_from_github()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _filter_month_cached(rows: list[dict], year: int, month: int) -> list[dict]:
+    return ustore.filter_month(rows, year, month)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _store_df(rows: list[dict]) -> pd.DataFrame:
+    """Store rows as a DataFrame with dates parsed in one vectorized pass.
+
+    pd.to_datetime parses the whole column at C speed; the previous per-row
+    fromisoformat loop dominates once the store spans years of entries.
+    Rows whose date doesn't parse are dropped, like the old try/except did.
+    """
+    df = pd.DataFrame(rows, columns=["doctor", "date", "shift", "note", "updated_at"])
+    parsed = pd.to_datetime(df["date"], format="ISO8601", errors="coerce")
+    ok = parsed.notna()
+    df = df[ok].copy()
+    df["_date"] = parsed[ok].dt.date
+    df["_yy"] = parsed[ok].dt.year
+    df["_mm"] = parsed[ok].dt.month
+    return df
+
+def _rows_digest(rows: list[dict]) -> bytes:
+    """Order-insensitive content hash of store rows.
+
+    updated_at is deliberately excluded: a no-op save re-stamps the
+    rewritten months with fresh timestamps, and that alone must not count
+    as a change worth a GitHub commit.
+    """
+    key = sorted(
+        (r.get("doctor", ""), r.get("date", "")[:10], r.get("shift", ""), r.get("note", ""))
+        for r in rows
+    )
+    return hashlib.blake2b(repr(key).encode(), digest_size=16).digest()
+
+def save_store_to_github(rows: list[dict], sha: str | None, message: str, rebase=None):
+    """Write the store with a single PUT on the pre-fetched sha.
+
+    On a 409 conflict (someone else saved between our load and this PUT),
+    if `rebase` is given it receives the freshly fetched rows and must
+    return the rows to write — re-applying this session's changes on top —
+    and the PUT is retried once on the fresh sha. Re-sending the original
+    `rows` would silently revert the other session's save, so without a
+    rebase callback the conflict propagates to the caller.
+    """
     g = _github_cfg()
-    text = ustore.to_csv(rows)
-    github_utils.put_file(
+    kwargs = dict(
         owner=g["owner"],
         repo=g["repo"],
         path=g["path"],
         token=g["token"],
         branch=g.get("branch", "main"),
-        sha=sha,
         message=message,
-        text=text,
     )
+    try:
+        github_utils.put_file(sha=sha, text=ustore.to_csv(rows), **kwargs)
+    except requests.HTTPError as e:
+        if rebase is None or getattr(e.response, "status_code", None) != 409:
+            raise
+        gf = github_utils.get_file(
+            owner=g["owner"],
+            repo=g["repo"],
+            path=g["path"],
+            token=g["token"],
+            branch=g.get("branch", "main"),
+        )
+        fresh_rows = ustore.load_store(gf.text) if gf else []
+        github_utils.put_file(sha=gf.sha if gf else None, text=ustore.to_csv(rebase(fresh_rows)), **kwargs)
 
 
 # ---------------- GitHub settings & audit log ----------------
@@ -506,8 +651,9 @@ mode = st.sidebar.radio(
 )
 
 # Load default rules (for doctor list)
-cfg_default = tg.load_rules(DEFAULT_RULES_PATH)
-doctors_default = doctors_from_cfg(cfg_default)
+_rules_mtime = DEFAULT_RULES_PATH.stat().st_mtime
+cfg_default = _default_rules(_rules_mtime)
+doctors_default = _default_doctors(_rules_mtime)
 
 # =====================================================================
 #                        MEDICO – Indisponibilità
@@ -525,9 +671,9 @@ if mode == "Indisponibilità (Medico)":
         st.stop()
 
     # ---- Session state (evita che l'app 'torni alla home' ad ogni modifica) ----
-    if "doctor_auth_ok" not in st.session_state:
-        st.session_state.doctor_auth_ok = False
-        st.session_state.doctor_name = None
+    # setdefault: single-write init, can never clobber values on a rerun
+    st.session_state.setdefault("doctor_auth_ok", False)
+    st.session_state.setdefault("doctor_name", None)
 
     if st.session_state.doctor_auth_ok:
         st.success(f"Accesso attivo: **{st.session_state.doctor_name}**")
@@ -562,12 +708,7 @@ if mode == "Indisponibilità (Medico)":
 
     # ---- Selezione mesi da compilare (Anno + Mese separati) ----
     today = date.today()
-    horizon_years = 20  # ampia finestra per evitare modifiche future
-    year_options = list(range(today.year, today.year + horizon_years + 1))
-    month_names = {
-        1: "Gennaio", 2: "Febbraio", 3: "Marzo", 4: "Aprile", 5: "Maggio", 6: "Giugno",
-        7: "Luglio", 8: "Agosto", 9: "Settembre", 10: "Ottobre", 11: "Novembre", 12: "Dicembre",
-    }
+    year_options = [y for y in YEAR_OPTIONS_BASE if y >= today.year]
 
     sel_default = st.session_state.get("doctor_selected_months") or [(today.year, today.month)]
     sel_set = set(sel_default)
@@ -580,7 +721,7 @@ if mode == "Indisponibilità (Medico)":
         mm_sel = st.selectbox(
             "Mese",
             list(range(1, 13)),
-            format_func=lambda m: f"{m:02d} - {month_names.get(m, str(m))}",
+            format_func=MONTH_LABELS.__getitem__,
             key="doctor_month_sel",
         )
     with c3:
@@ -606,7 +747,7 @@ if mode == "Indisponibilità (Medico)":
 
     # Load store after auth (so we don't hit GitHub before login)
     try:
-        store_rows, store_sha = load_store_from_github()
+        store_rows, store_sha = _cached_store()
     except Exception as e:
         st.error(f"Errore accesso archivio indisponibilità: {e}")
         st.stop()
@@ -635,86 +776,160 @@ if mode == "Indisponibilità (Medico)":
 
     st.divider()
 
-    tabs = st.tabs([label_map[x] for x in selected])
-    edited_by_month = {}
-    normalized_entries_by_month = {}
-    violations_by_month = {}
-    info_by_month = {}
+    # Bucket this doctor's rows by (year, month) from the cached DataFrame:
+    # dates are parsed once for the whole store, vectorized, instead of
+    # per-row (and formerly once per selected month tab).
+    store_df = _store_df(store_rows)
+    mine = store_df[store_df["doctor"] == doctor]
+    rows_by_month: dict[tuple[int, int], list[dict]] = {
+        (int(yy0), int(mm0)): grp.drop(columns=["_yy", "_mm"]).to_dict("records")
+        for (yy0, mm0), grp in mine.groupby(["_yy", "_mm"], sort=False)
+    }
 
-    for (yy, mm), tab in zip(selected, tabs):
-        with tab:
-            st.caption("Inserisci righe con Data + Fascia. Le righe vuote verranno ignorate.")
-            existing = ustore.filter_doctor_month(store_rows, doctor, yy, mm)
+    # Fragment: a keystroke in one month's editor reruns only that month's
+    # subtree instead of the whole script (auth check, GitHub fetch, etc.).
+    # Results are published via session_state so the save handler — which
+    # runs on a full rerun — can pick them up.
+    @st.fragment
+    def _render_month(yy: int, mm: int) -> None:
+        st.caption("Inserisci righe con Data + Fascia. Le righe vuote verranno ignorate.")
+
+        # Keep the editor's initial content referentially stable: a fresh
+        # list per rerun makes the frontend re-reconcile the widget even
+        # though nothing changed. Rebuild only when the store sha moves.
+        init_key = f"unav_init_{doctor}_{yy}_{mm}"
+        cached_init = st.session_state.get(init_key)
+        if not isinstance(cached_init, dict) or cached_init.get("sha") != store_sha:
+            existing = rows_by_month.get((yy, mm), [])
             init = []
-            conversions = []
+            # Parallel columns for the conversion report: built columnar so
+            # the DataFrame is assembled in one shot instead of from a list
+            # of per-row dicts.
+            conv_dates, conv_raw, conv_canon, conv_note = [], [], [], []
             for r in existing:
-                try:
-                    d = datetime.fromisoformat(r["date"]).date()
-                except Exception:
-                    d = r["date"]
+                d = r["_date"]
                 raw_shift = r.get("shift", "")
                 canon_shift, changed, unknown = normalize_fascia(raw_shift)
                 if changed:
-                    conversions.append({
-                        "Data": d,
-                        "Fascia_originale": raw_shift,
-                        "Fascia_impostata": canon_shift,
-                        "Nota": "Non riconosciuta (default applicato)" if unknown else "Normalizzata",
-                    })
+                    conv_dates.append(d)
+                    conv_raw.append(raw_shift)
+                    conv_canon.append(canon_shift)
+                    conv_note.append("Non riconosciuta (default applicato)" if unknown else "Normalizzata")
                 init.append({"Data": d, "Fascia": canon_shift or "Tutto il giorno", "Note": r.get("note", "")})
 
-            if conversions:
-                st.warning("Abbiamo trovato alcune fasce non standard salvate in passato. Le abbiamo normalizzate automaticamente: controlla e, se necessario, modifica dal menu a tendina prima di salvare.")
-                st.dataframe(conversions, use_container_width=True, hide_index=True)
-
-
             if not init:
                 init = [{"Data": date(yy, mm, 1), "Fascia": "Mattina", "Note": ""}]
 
-            if unav_open:
-                edited = st.data_editor(
-                    init,
-                    num_rows="dynamic",
-                    use_container_width=True,
-                    column_config={
-                        "Data": st.column_config.DateColumn("Data", required=True),
-                        "Fascia": st.column_config.SelectboxColumn("Fascia", options=FASCIA_OPTIONS, required=True),
-                        "Note": st.column_config.TextColumn("Note"),
-                    },
-                    key=f"unav_editor_{doctor}_{yy}_{mm}",
-                )
-            else:
-                # Read-only view when the admin closes submissions
-                st.dataframe(init, use_container_width=True, hide_index=True)
-                edited = init
-
-            edited_by_month[(yy, mm)] = edited
-
-            # Normalize & validate + enforce max per shift (per month)
-            entries_norm, info = extract_entries_from_editor(edited, yy, mm)
-            normalized_entries_by_month[(yy, mm)] = entries_norm
-            info_by_month[(yy, mm)] = info
-
-            counts = info.get("counts", {}) or {}
-            over = {sh: n for sh, n in counts.items() if n > max_per_shift}
-            violations_by_month[(yy, mm)] = over
+            conversions = None
+            if conv_dates:
+                conversions = pd.DataFrame({
+                    "Data": conv_dates,
+                    "Fascia_originale": conv_raw,
+                    "Fascia_impostata": conv_canon,
+                    "Nota": conv_note,
+                })
+            cached_init = {"sha": store_sha, "init": init, "conversions": conversions}
+            st.session_state[init_key] = cached_init
+
+        init = cached_init["init"]
+        conversions = cached_init["conversions"]
+
+        # Re-activating a month after it was inactive: Streamlit drops the
+        # keyed state of widgets not rendered during a full run, so the
+        # editor's own edits are gone — but the entries it last published
+        # are not. Re-seed the editor from those (when the store hasn't
+        # moved underneath) so switching months doesn't revert unsaved
+        # edits. The seeded list replaces the cached init so later fragment
+        # reruns keep handing the editor the same object.
+        editor_key = f"unav_editor_{doctor}_{yy}_{mm}"
+        published = st.session_state.get(f"unav_entries_{doctor}_{yy}_{mm}")
+        published_sha = st.session_state.get(f"unav_entries_sha_{doctor}_{yy}_{mm}")
+        if editor_key not in st.session_state and published is not None and published_sha == store_sha:
+            init = [{"Data": d, "Fascia": sh, "Note": note} for d, sh, note in published]
+            if not init:
+                # same seed the app uses for a month with no saved rows
+                init = [{"Data": date(yy, mm, 1), "Fascia": "Mattina", "Note": ""}]
+            cached_init["init"] = init
+
+        if conversions is not None:
+            st.warning("Abbiamo trovato alcune fasce non standard salvate in passato. Le abbiamo normalizzate automaticamente: controlla e, se necessario, modifica dal menu a tendina prima di salvare.")
+            st.dataframe(conversions, use_container_width=True, hide_index=True)
+
+        if unav_open:
+            edited = st.data_editor(
+                init,
+                num_rows="dynamic",
+                use_container_width=True,
+                column_config={
+                    "Data": st.column_config.DateColumn("Data", required=True),
+                    "Fascia": st.column_config.SelectboxColumn("Fascia", options=FASCIA_OPTIONS, required=True),
+                    "Note": st.column_config.TextColumn("Note"),
+                },
+                key=f"unav_editor_{doctor}_{yy}_{mm}",
+            )
+        else:
+            # Read-only view when the admin closes submissions
+            st.dataframe(init, use_container_width=True, hide_index=True)
+            edited = init
+
+        # Normalize & validate + enforce max per shift (per month)
+        entries_norm, info = extract_entries_from_editor(edited, yy, mm)
+        st.session_state[f"unav_entries_{doctor}_{yy}_{mm}"] = entries_norm
+        # Tag the published entries with the store version they were edited
+        # against: the reseed above must not resurrect them once a save (or
+        # another session) has moved the store.
+        st.session_state[f"unav_entries_sha_{doctor}_{yy}_{mm}"] = store_sha
+
+        counts = info.get("counts", {}) or {}
+        over = {sh: n for sh, n in counts.items() if n > max_per_shift}
+        prev_over = st.session_state.get(f"unav_over_{doctor}_{yy}_{mm}")
+        st.session_state[f"unav_over_{doctor}_{yy}_{mm}"] = over
+
+        # The save button lives outside the fragment, so its disabled state
+        # only updates on full reruns. When this month crosses (or clears)
+        # the per-fascia limit, escalate to an app-scope rerun so the save
+        # controls resync; otherwise the button could stay greyed out after
+        # the doctor fixed the rows.
+        if prev_over is not None and prev_over != over:
+            st.rerun(scope="app")
+
+        if info.get("out_of_month"):
+            st.warning(
+                f"⚠️ {info['out_of_month']} righe con data fuori mese sono state ignorate "
+                f"(devono essere in {yy}-{mm:02d})."
+            )
+        if info.get("invalid_date"):
+            st.warning(f"⚠️ {info['invalid_date']} righe hanno una data non valida e sono state ignorate.")
 
-            if info.get("out_of_month"):
-                st.warning(
-                    f"⚠️ {info['out_of_month']} righe con data fuori mese sono state ignorate "
-                    f"(devono essere in {yy}-{mm:02d})."
-                )
-            if info.get("invalid_date"):
-                st.warning(f"⚠️ {info['invalid_date']} righe hanno una data non valida e sono state ignorate.")
+        st.caption(
+            "Conteggi mese (per fascia): "
+            + ", ".join([f"{sh} {counts.get(sh, 0)}/{max_per_shift}" for sh in FASCIA_OPTIONS])
+        )
 
-            st.caption(
-                "Conteggi mese (per fascia): "
-                + ", ".join([f"{sh} {counts.get(sh, 0)}/{max_per_shift}" for sh in FASCIA_OPTIONS])
-            )
+        if over:
+            pretty = ", ".join([f"{sh}: {n}/{max_per_shift}" for sh, n in over.items()])
+            st.error(f"Limite superato in questo mese → {pretty}. Rimuovi alcune righe prima di salvare.")
+
+    # Only the active month's editor is instantiated: st.tabs would execute
+    # every tab body on each rerun (N data_editors for N selected months).
+    # A radio exposes the active selection; inactive months' pending edits
+    # live on as their published unav_entries_* snapshots, which reseed the
+    # editor when the month becomes active again (see _render_month).
+    if st.session_state.get("doctor_active_month") not in sel_set:
+        st.session_state.pop("doctor_active_month", None)
+    active_month = st.radio(
+        "Mese attivo",
+        selected,
+        format_func=label_map.__getitem__,
+        horizontal=True,
+        key="doctor_active_month",
+    )
+    _render_month(*active_month)
 
-            if over:
-                pretty = ", ".join([f"{sh}: {n}/{max_per_shift}" for sh, n in over.items()])
-                st.error(f"Limite superato in questo mese → {pretty}. Rimuovi alcune righe prima di salvare.")
+    violations_by_month = {
+        (yy, mm): st.session_state.get(f"unav_over_{doctor}_{yy}_{mm}", {})
+        for (yy, mm) in selected
+    }
 
     any_over = any(bool(v) for v in (violations_by_month or {}).values())
     can_save = bool(unav_open) and (not any_over)
@@ -723,13 +938,24 @@ if mode == "Indisponibilità (Medico)":
     with c1:
         save = st.button("Salva indisponibilità", type="primary", disabled=not can_save)
     with c2:
-        st.caption("Privacy: salviamo solo le righe del tuo nominativo nei mesi selezionati.")
+        st.caption("Privacy: salviamo solo le righe del tuo nominativo nei mesi che hai aperto.")
 
     if save:
         if not unav_open:
             st.error("Inserimento indisponibilità chiuso dall'amministratore: non è possibile salvare.")
             st.stop()
 
+        # Pull the normalized entries from session_state only now: the
+        # editors publish them on every (fragment) rerun, so there is no
+        # need to materialize this dict outside the save path. Months never
+        # opened this session have no published entries: leave them out
+        # entirely so saving doesn't silently wipe them from the store.
+        normalized_entries_by_month = {
+            (yy, mm): st.session_state[f"unav_entries_{doctor}_{yy}_{mm}"]
+            for (yy, mm) in selected
+            if f"unav_entries_{doctor}_{yy}_{mm}" in st.session_state
+        }
+
         # Server-side re-check (in caso di race / rerun)
         hard_viol = []
         for (yy, mm), entries_norm in (normalized_entries_by_month or {}).items():
@@ -750,21 +976,38 @@ if mode == "Indisponibilità (Medico)":
             st.stop()
 
         updated_at = datetime.utcnow().isoformat(timespec="seconds") + "Z"
-        new_rows = list(store_rows)
 
+        # Assemble all per-month updates first, then rewrite the store in a
+        # single pass (replace_doctor_month per month would rescan the whole
+        # list once per selected month).
         audit_todo: list[tuple[str, dict]] = []
+        entries_by_month: dict[tuple[int, int], list] = {}
         for (yy, mm), entries_norm in (normalized_entries_by_month or {}).items():
-            existing_rows = ustore.filter_doctor_month(store_rows, doctor, int(yy), int(mm))
+            existing_rows = rows_by_month.get((int(yy), int(mm)), [])
             diff = compute_unavailability_diff(existing_rows, entries_norm)
             if diff.get("added_count") or diff.get("removed_count") or diff.get("note_changed_count"):
                 audit_todo.append((f"{int(yy)}-{int(mm):02d}", diff))
+            entries_by_month[(int(yy), int(mm))] = entries_norm
 
-            new_rows = ustore.replace_doctor_month(
-                new_rows, doctor, int(yy), int(mm), entries_norm, updated_at=updated_at
-            )
+        new_rows = ustore.replace_doctor_months(store_rows, doctor, entries_by_month, updated_at=updated_at)
+
+        # Nothing actually changed (open, look, click save): skip the GitHub
+        # PUT — and the commit it would create — entirely.
+        if _rows_digest(new_rows) == _rows_digest(store_rows):
+            st.info("Nessuna modifica da salvare.")
+            st.stop()
 
         try:
-            save_store_to_github(new_rows, store_sha, message=f"Update unavailability: {doctor} ({updated_at})")
+            save_store_to_github(
+                new_rows,
+                store_sha,
+                message=f"Update unavailability: {doctor} ({updated_at})",
+                # On a 409 conflict, re-apply this doctor's months on top of
+                # whatever the other session saved instead of reverting it.
+                rebase=lambda fresh_rows: ustore.replace_doctor_months(
+                    fresh_rows, doctor, entries_by_month, updated_at=updated_at
+                ),
+            )
 
             # Monthly audit log (best-effort)
             for mk_audit, diff in audit_todo:
@@ -786,6 +1029,7 @@ if mode == "Indisponibilità (Medico)":
                 except Exception as e:
                     st.warning(f"Audit log non aggiornato per {mk_audit}: {e}")
 
+            _cached_store.clear()  # next rerun must see the rows just saved
             st.success("Salvato ✅")
             st.rerun()
         except Exception as e:
@@ -807,8 +1051,7 @@ else:
         st.stop()
 
     # Persist admin auth across reruns
-    if "admin_auth_ok" not in st.session_state:
-        st.session_state.admin_auth_ok = False
+    st.session_state.setdefault("admin_auth_ok", False)
 
     if not st.session_state.admin_auth_ok:
         with st.form("admin_login"):
@@ -1015,7 +1258,7 @@ else:
     )
     unav_upload = None
     if unav_mode == "Carica file manuale":
-        unav_upload = st.file_uploader("Carica indisponibilità (xlsx/csv/tsv)", type=["xlsx", "csv", "tsv"])
+        unav_upload = st.file_uploader("Carica indisponibilità (xlsx/csv/tsv)", type=["xlsx", "csv", "tsv"], key="unav_upload")
     use_archive = (unav_mode == "Usa archivio (privacy)")
 
     # Step 3: Vincolo post-notte (carryover)
@@ -1031,13 +1274,16 @@ else:
     # Admin advanced (rules/template/carryover file)
     with st.expander("⚙️ Avanzate (Regole, Template, Carryover file)", expanded=False):
         st.markdown("**Regole (solo Admin)**")
-        rules_upload = st.file_uploader("Carica Regole YAML (opzionale)", type=["yml", "yaml"])
+        rules_upload = st.file_uploader("Carica Regole YAML (opzionale)", type=["yml", "yaml"], key="rules_upload")
         cfg_admin, rules_path = load_rules_from_source(rules_upload)
-        doctors = doctors_from_cfg(cfg_admin)
+        if rules_upload is not None:
+            doctors = rules_cache.doctors(rules_upload.getvalue())
+        else:
+            doctors = _default_doctors(DEFAULT_RULES_PATH.stat().st_mtime)
 
         st.markdown("**Template Excel**")
-        template_upload = st.file_uploader("Carica template turni (opzionale)", type=["xlsx"])
-        style_upload = st.file_uploader("Carica Style_Template.xlsx (opzionale)", type=["xlsx"])
+        template_upload = st.file_uploader("Carica template turni (opzionale)", type=["xlsx"], key="template_upload")
+        style_upload = st.file_uploader("Carica Style_Template.xlsx (opzionale)", type=["xlsx"], key="style_upload")
         sheet_name = st.text_input("Nome foglio (opzionale)", value="")
 
         st.markdown("**Carryover – file mese precedente (opzionale)**")
@@ -1045,8 +1291,9 @@ else:
 
     # If advanced not expanded, still need cfg_admin/doctors variables
     if "cfg_admin" not in locals():
-        cfg_admin, rules_path = tg.load_rules(DEFAULT_RULES_PATH), DEFAULT_RULES_PATH
-        doctors = doctors_from_cfg(cfg_admin)
+        _rules_mtime = DEFAULT_RULES_PATH.stat().st_mtime
+        cfg_admin, rules_path = _default_rules(_rules_mtime), DEFAULT_RULES_PATH
+        doctors = _default_doctors(_rules_mtime)
         template_upload = None
         style_upload = None
         sheet_name = ""
@@ -1065,8 +1312,11 @@ else:
 
     # From file
     if prev_out is not None:
+        import tempfile
+        import time
+
         tmp_prev = Path(tempfile.gettempdir()) / f"prev_{int(time.time())}.xlsx"
-        tmp_prev.write_bytes(prev_out.getvalue())
+        _spill_upload(prev_out, tmp_prev)
         try:
             carry_info = tg.extract_carryover_from_output_xlsx(
                 tmp_prev,
@@ -1085,10 +1335,9 @@ else:
     # Manual fallback
     if manual_block:
         carryover_by_month.setdefault(mk, {})
-        carryover_by_month[mk].setdefault("blocked_day1_doctors", [])
-        for d in manual_block:
-            if d not in carryover_by_month[mk]["blocked_day1_doctors"]:
-                carryover_by_month[mk]["blocked_day1_doctors"].append(d)
+        blocked = set(carryover_by_month[mk].get("blocked_day1_doctors") or [])
+        blocked.update(manual_block)
+        carryover_by_month[mk]["blocked_day1_doctors"] = sorted(blocked)
 
     st.divider()
 
@@ -1096,6 +1345,11 @@ else:
     generate = st.button("🚀 Genera turni", type="primary")
 
     if generate:
+        # Heavy run-only imports live here: pre-generation reruns (PIN typing,
+        # widget wiring) never pay for them.
+        import tempfile
+        import time
+
         t0 = time.time()
         status = st.status("Preparazione…", expanded=True)
         try:
@@ -1104,35 +1358,57 @@ else:
                 rules_path_use = rules_path
 
                 status.update(label="Preparazione template…", state="running")
+                template_job = None
                 if template_upload is not None:
                     template_path = td / "template.xlsx"
-                    template_path.write_bytes(template_upload.getvalue())
+                    _spill_upload(template_upload, template_path)
                 else:
                     # Auto template
                     if style_upload is not None:
                         style_path = td / "Style_Template.xlsx"
-                        style_path.write_bytes(style_upload.getvalue())
+                        _spill_upload(style_upload, style_path)
                     else:
                         style_path = DEFAULT_STYLE_TEMPLATE if DEFAULT_STYLE_TEMPLATE.exists() else None
                     template_path = td / f"turni_{mk}.xlsx"
-                    tg.create_month_template_xlsx(
-                        rules_path_use,
-                        int(year),
-                        int(month),
-                        out_path=template_path,
-                        sheet_name=sheet_name or None,
+                    template_job = (
+                        tg.create_month_template_xlsx,
+                        (rules_path_use, int(year), int(month)),
+                        {"out_path": template_path, "sheet_name": sheet_name or None},
                     )
 
                 status.update(label="Carico indisponibilità…", state="running")
                 unav_path = None
+                unav_job = None
+                rows_month = None
                 if unav_mode == "Carica file manuale" and unav_upload is not None:
                     unav_path = td / "unavailability.xlsx"
-                    unav_path.write_bytes(unav_upload.getvalue())
+                    _spill_upload(unav_upload, unav_path)
                 elif use_archive:
-                    store_rows, _sha = load_store_from_github()
-                    rows_month = ustore.filter_month(store_rows, int(year), int(month))
+                    store_rows, _sha = _cached_store()
+                    rows_month = _filter_month_cached(store_rows, int(year), int(month))
                     unav_path = td / "unavailability_from_store.xlsx"
-                    xlsx_utils.build_unavailability_xlsx(rows_month, DEFAULT_UNAV_TEMPLATE, unav_path)
+                    unav_job = (
+                        xlsx_utils.build_unavailability_xlsx,
+                        (rows_month, DEFAULT_UNAV_TEMPLATE, unav_path),
+                        {},
+                    )
+
+                # The template build and the archive->xlsx build are
+                # independent openpyxl jobs writing to different files; when
+                # both are needed, overlap them (zipfile I/O spends much of
+                # its time outside the GIL). Streamlit cache lookups above
+                # stay on the main thread.
+                jobs = [j for j in (template_job, unav_job) if j is not None]
+                if len(jobs) > 1:
+                    from concurrent.futures import ThreadPoolExecutor
+
+                    with ThreadPoolExecutor(max_workers=len(jobs)) as ex:
+                        for fut in [ex.submit(fn, *a, **kw) for fn, a, kw in jobs]:
+                            fut.result()
+                else:
+                    for fn, a, kw in jobs:
+                        fn(*a, **kw)
+                if rows_month is not None:
                     st.caption(f"Archivio indisponibilità: {len(rows_month)} righe per {mk}")
 
                 status.update(label="Generazione turni…", state="running")
@@ -1148,24 +1424,30 @@ else:
 
                 status.update(label="Completato ✅", state="complete")
 
-                # Persist outputs in session_state so that download clicks do not
-                # "lose" the generated files (Streamlit re-runs the script on
-                # every widget interaction).
-                excel_bytes = out_path.read_bytes()
-                log_bytes = None
+                # Move outputs to the per-session dir so download clicks do
+                # not "lose" them (Streamlit re-runs the script on every
+                # widget interaction). Only the paths go in session_state;
+                # the files stay on disk instead of in RAM.
+                outdir = _session_outdir()
+                final_xlsx = outdir / f"turni_{mk}.xlsx"
+                shutil.move(str(out_path), final_xlsx)
+                final_log = None
                 if log_path and Path(log_path).exists():
-                    log_bytes = Path(log_path).read_bytes()
+                    final_log = outdir / f"solverlog_{mk}.txt"
+                    shutil.move(str(log_path), final_log)
 
                 st.session_state["last_generated"] = {
                     "mk": mk,
-                    "excel_bytes": excel_bytes,
-                    "log_bytes": log_bytes,
+                    "excel_path": str(final_xlsx),
+                    "log_path": str(final_log) if final_log else None,
                     "stats": stats,
                     "elapsed_s": round(time.time() - t0, 2),
                     "generated_at": datetime.now().isoformat(timespec="seconds"),
                 }
 
         except Exception:
+            import traceback
+
             status.update(label="Errore ❌", state="error")
             st.error("Errore durante la generazione.")
             st.code(traceback.format_exc())
@@ -1173,23 +1455,27 @@ else:
     # Downloads + summary (sticky): if a file was generated for this month, keep
     # the buttons visible even after clicking one of them.
     last = st.session_state.get("last_generated")
-    if isinstance(last, dict) and last.get("mk") == mk and last.get("excel_bytes"):
+    _excel_path = Path(last["excel_path"]) if isinstance(last, dict) and last.get("excel_path") else None
+    if isinstance(last, dict) and last.get("mk") == mk and _excel_path is not None and _excel_path.exists():
         _stats = last.get("stats") if isinstance(last.get("stats"), dict) else {}
         st.success(
             f"Creato ✅ in {last.get('elapsed_s')}s | status={_stats.get('status')} | {last.get('generated_at','')}"
         )
 
+        # download_button accepts a file handle: the xlsx is read from disk
+        # when serving instead of living in session_state between reruns.
         st.download_button(
             "⬇️ Scarica Excel turni",
-            data=last["excel_bytes"],
+            data=_excel_path.open("rb"),
             file_name=f"turni_{mk}.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             key=f"dl_xlsx_{mk}",
         )
-        if last.get("log_bytes"):
+        _log_path = Path(last["log_path"]) if last.get("log_path") else None
+        if _log_path is not None and _log_path.exists():
             st.download_button(
                 "⬇️ Scarica solver log",
-                data=last["log_bytes"],
+                data=_log_path.open("rb"),
                 file_name=f"solverlog_{mk}.txt",
                 mime="text/plain",
                 key=f"dl_log_{mk}",
@@ -108,8 +108,22 @@ def replace_doctor_month(
     updated_at: Optional[str] = None,
 ) -> List[Dict[str, str]]:
     """Replace all entries for doctor+month with new_entries."""
+    return replace_doctor_months(rows, doctor, {(year, month): new_entries}, updated_at=updated_at)
+
+def replace_doctor_months(
+    rows: List[Dict[str, str]],
+    doctor: str,
+    entries_by_month: Dict[Tuple[int, int], Iterable[Tuple[dt.date, str, str]]],
+    updated_at: Optional[str] = None,
+) -> List[Dict[str, str]]:
+    """Replace all entries for doctor in every (year, month) key, in one pass.
+
+    Batch variant of replace_doctor_month: the store list is walked once
+    regardless of how many months are being rewritten.
+    """
     updated_at = updated_at or dt.datetime.now(dt.timezone.utc).isoformat()
     doctor = doctor.strip()
+    months = set(entries_by_month.keys())
     kept=[]
     for r in rows:
         if (r.get("doctor") or "") != doctor:
@@ -118,23 +132,24 @@ def replace_doctor_month(
             d = parse_iso_date(r.get("date",""))
         except Exception:
             continue
-        if d.year==year and d.month==month:
+        if (d.year, d.month) in months:
             continue  # drop
         kept.append(r)
 
-    for d, shift, note in new_entries:
-        if not isinstance(d, dt.date):
-            continue
-        sh = norm_shift(shift)
-        if sh not in VALID_SHIFTS:
-            continue
-        kept.append({
-            "doctor": doctor,
-            "date": d.isoformat(),
-            "shift": sh,
-            "note": (note or "").strip(),
-            "updated_at": updated_at,
-        })
+    for new_entries in entries_by_month.values():
+        for d, shift, note in new_entries:
+            if not isinstance(d, dt.date):
+                continue
+            sh = norm_shift(shift)
+            if sh not in VALID_SHIFTS:
+                continue
+            kept.append({
+                "doctor": doctor,
+                "date": d.isoformat(),
+                "shift": sh,
+                "note": (note or "").strip(),
+                "updated_at": updated_at,
+            })
 
     # de-duplicate by (doctor,date,shift) keep latest
     dedup: Dict[Tuple[str,str,str], Dict[str,str]] = {}